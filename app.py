@@ -2,14 +2,18 @@ from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
 import os
+import asyncio
+import time
 import tempfile
 import shutil
 from typing import List, Dict, Any
 import logging
 from pathlib import Path
 import uuid
-from process_ocr_output import process_pdf_to_json
+import orjson
+from process_ocr_output import process_pdf_to_json, shutdown_page_executor
 
 # Set up logging
 logging.basicConfig(
@@ -18,10 +22,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson, which is much faster than json.dumps for large transaction lists."""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop the PDF parsing worker processes with the server
+    shutdown_page_executor()
+
 app = FastAPI(
     title="Bank Statement Processor API",
     description="API for processing bank statements and extracting transaction data",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Enable CORS
@@ -35,8 +52,62 @@ app.add_middleware(
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 64 * 1024
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# In-memory store for background processing jobs, keyed by job id.
+# Finished jobs are dropped JOB_TTL_SECONDS after completion.
+# At most MAX_CONCURRENT_JOBS run at once; the rest wait as "pending",
+# and new jobs are refused once MAX_QUEUED_JOBS are unfinished.
+JOB_TTL_SECONDS = 3600
+MAX_CONCURRENT_JOBS = 2
+MAX_QUEUED_JOBS = 20
+jobs: Dict[str, Dict[str, Any]] = {}
+job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+async def save_upload(file: UploadFile) -> str:
+    """
+    Spool an uploaded file to a temporary PDF in UPLOAD_DIR and return its path.
+    The caller is responsible for deleting the file.
+    """
+    await file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=UPLOAD_DIR) as tmp:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                tmp.write(chunk)
+        except Exception:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    return tmp.name
+
+async def run_job(job_id: str, temp_file_path: str):
+    """Process a spooled PDF in the background and record the outcome on the job."""
+    job = jobs[job_id]
+    try:
+        async with job_slots:
+            result = await process_pdf_to_json(temp_file_path)
+        if 'error' in result:
+            job.update(status="failed", error=result['error'])
+        else:
+            job.update(status="completed", result=result)
+    except Exception as e:
+        logger.error("Error processing job %s: %s", job_id, e, exc_info=True)
+        job.update(status="failed", error=f"Error processing file: {str(e)}")
+    finally:
+        job["finished_at"] = time.time()
+        job.pop("task", None)
+        try:
+            os.unlink(temp_file_path)
+        except OSError as e:
+            logger.warning("Could not remove temporary file %s: %s", temp_file_path, e)
+
+def prune_jobs():
+    """Drop finished jobs whose results have been kept for longer than JOB_TTL_SECONDS."""
+    now = time.time()
+    for job_id in [job_id for job_id, job in jobs.items() if now - job.get("finished_at", now) > JOB_TTL_SECONDS]:
+        del jobs[job_id]
+
 @app.post("/api/process-statement", response_model=Dict[str, Any])
 async def process_statement(file: UploadFile = File(...)):
     """
@@ -48,27 +119,66 @@ async def process_statement(file: UploadFile = File(...)):
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
-        # # Save the uploaded file temporarily
-        # unique_filename = f"{uuid.uuid4()}_{file.filename}"
-        # temp_file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        # with open(temp_file_path, "wb") as buffer:
-        #     shutil.copyfileobj(file.file, buffer)
+        logger.info("Processing file: %s", file.filename)
         
-        logger.info(f"Processing file: {file.file}")
-        
-        # Process the PDF
-        result = process_pdf_to_json(file.file)
+        # Spool the upload to disk so pdfplumber can parse it by path in a worker thread
+        temp_file_path = await save_upload(file)
+        try:
+            # Process the PDF
+            result = await process_pdf_to_json(temp_file_path)
+        finally:
+            os.unlink(temp_file_path)
         
         if 'error' in result:
             raise HTTPException(status_code=400, detail=result['error'])
             
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}", exc_info=True)
+        logger.error("Error processing file: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.post("/api/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """
+    Queue a bank statement PDF for processing and return immediately with a job id.
+    Poll `GET /api/jobs/{job_id}` for the result.
+    
+    - **file**: The bank statement PDF file to process
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    prune_jobs()
+    if sum(1 for job in jobs.values() if "finished_at" not in job) >= MAX_QUEUED_JOBS:
+        raise HTTPException(status_code=503, detail="Too many jobs in progress, please retry later")
+    temp_file_path = await save_upload(file)
+    job_id = str(uuid.uuid4())
+    jobs[job_id] = {"status": "pending", "filename": file.filename}
+    # Keep a reference to the task so it is not garbage collected while running
+    jobs[job_id]["task"] = asyncio.create_task(run_job(job_id, temp_file_path))
+    logger.info("Queued job %s for file: %s", job_id, file.filename)
+    
+    return {"job_id": job_id, "status": "pending"}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Return the status of a processing job, with the extracted data once it has completed.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    response = {"job_id": job_id, "status": job["status"]}
+    if job["status"] == "completed":
+        response["result"] = job["result"]
+    elif job["status"] == "failed":
+        response["error"] = job["error"]
+    return response
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
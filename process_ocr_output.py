@@ -1,107 +1,436 @@
 import os
+import hashlib
+import time
+import functools
+import asyncio
+import threading
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pdfplumber
-import pandas as pd
 import logging
 import re
 from datetime import datetime
-from openai import OpenAI
+from typing import List, Literal, Optional
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ValidationError
 import json
 from dotenv import load_dotenv
 
 
 load_dotenv()  # Load environment variables from .env file
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('pdf_table_extractor.log'),
+        # Not rotated here: the PDF worker processes append to the same file, and rotating it from
+        # several processes is unsupported. delay=True opens the file only once something is written.
+        logging.FileHandler('pdf_table_extractor.log', delay=True),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+OPENAI_MODEL = "gpt-4o-mini"
+PROMPT_VERSION = "v2"  # Bump whenever the prompts change to invalidate cached responses
+EXTRACTION_VERSION = "v1"  # Bump whenever the extracted text format changes to invalidate cached PDF text
+CACHE_DIR = "oai_cache"
+CACHE_TTL_SECONDS = 6 * 3600
+PDF_TEXT_CACHE_TTL_SECONDS = 24 * 3600
+PAGE_WORKERS = min(8, os.cpu_count() or 1)
+MAX_PAGES = int(os.getenv("MAX_PAGES", "50"))  # Pages beyond this are not parsed; results report the truncation
+if MAX_PAGES < 1:
+    raise ValueError(f"MAX_PAGES must be at least 1, got {MAX_PAGES}")
+MIN_PAGES_PER_WORKER = 4  # Smaller ranges are not worth the cost of re-opening the PDF in a worker
+MAX_CONCURRENT_CHUNKS = 5  # Cap on simultaneous OpenAI requests per statement, to respect rate limits
+MAX_PARSE_RETRIES = 2
+_TRAILING_WHITESPACE_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+_COLUMN_GAP_RE = re.compile(r'\s{2,}')
+
+class StatementPeriod(BaseModel):
+    start: str  # YYYY-MM-DD
+    end: str  # YYYY-MM-DD
+
+class AccountInfo(BaseModel):
+    account_holder: str
+    account_number: str
+    statement_period: StatementPeriod
+    opening_balance: Optional[float]
+    closing_balance: Optional[float]
+    currency: str
+    statement_format: Literal["wise", "nayapay", "bank_of_america", "traditional", "unknown"]
+
+class Transaction(BaseModel):
+    date: str  # YYYY-MM-DD
+    description: str
+    type: Literal["debit", "credit"]
+    amount: float
+    amount_with_sign: float
+    running_balance: Optional[float]
+    reference: Optional[str]
+
+class TransactionList(BaseModel):
+    transactions: List[Transaction]
+
 def create_output_directories():
     os.makedirs('table_txt', exist_ok=True)
 
-def parse_text_line(line):
+def normalize_text_line(line):
     # Customize this regex based on your statement layout!
-    # This example splits on 2+ spaces (for most bank statements)
-    return re.split(r'\s{2,}', line.strip())
+    # This example treats 2+ spaces as a column separator (for most bank statements)
+    # and emits the columns joined by exactly two spaces, without building a list of cells.
+    # Callers pass lines that are already stripped.
+    return _COLUMN_GAP_RE.sub("  ", line)
+
+def format_table_row(row):
+    # pdfplumber returns None for empty cells and may keep line breaks inside a cell
+    return "  ".join("" if cell is None else str(cell).replace("\n", " ") for cell in row)
 
 def process_pdf(pdf):
-    logger.info(f"Processing PDF")
+    logger.info("Processing PDF")
     found_tables = False
     
-    # Initialize empty DataFrames to store all data
-    all_tables_data = []
-    all_text_data = []
+    # Stream plain text lines into buffers page by page; the downstream consumer only needs a string
+    tables_buffer = io.StringIO()
+    text_buffer = io.StringIO()
     
     try:
         # Process all pages first and collect data
-        for page_num, page in enumerate(pdf.pages, 1):
-            logger.info(f"Extracting tables from page {page_num}/{len(pdf.pages)}")
+        pages = pdf.pages
+        total_pages = len(pages)
+        for page_idx, page in enumerate(pages, 1):
+            page_num = page.page_number
+            logger.info("Extracting tables from page %d (%d/%d)", page_num, page_idx, total_pages)
             tables = page.extract_tables()
             
             if tables and tables[0] and len(tables[0]) > 1:
                 found_tables = True
                 for table_idx, table in enumerate(tables, 1):
-                    df = pd.DataFrame(table)
-                    # Add page number and table index as columns
-                    all_tables_data.append(df)
-                    logger.info(f"Processed table {table_idx} from page {page_num}")
+                    for row in table:
+                        tables_buffer.write(format_table_row(row) + "\n")
+                    logger.info("Processed table %d from page %d", table_idx, page_num)
             else:
-                logger.info(f"No tables found on page {page_num}, extracting text as fallback...")
+                logger.info("No tables found on page %d, extracting text as fallback...", page_num)
                 # Text extraction for non-tabular layout
                 text = page.extract_text()
                 if text:
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    parsed_rows = [parse_text_line(line) for line in lines]
-                    df = pd.DataFrame(parsed_rows)
-                    all_text_data.append(df)
-                    logger.info(f"Processed text from page {page_num}")
+                    lines = [line for line in map(str.strip, text.split('\n')) if line]
+                    for line in lines:
+                        text_buffer.write(normalize_text_line(line) + "\n")
+                    logger.info("Processed text from page %d", page_num)
+            
+            # Drop the page's parsed layout objects and cached text map so memory does not grow with the page count
+            page.close()
         
         # Return the processed data
         result = {}
         
-        # Combine all tables data if any exists
-        if all_tables_data:
-            result['tables'] = pd.concat(all_tables_data, ignore_index=True)
+        # Return tables data if any exists
+        if tables_buffer.tell():
+            result['tables'] = tables_buffer.getvalue()
             logger.info("Tables data processed successfully")
         
-        # Combine all text data if any exists
-        if all_text_data:
-            result['text'] = pd.concat(all_text_data, ignore_index=True)
+        # Return text data if any exists
+        if text_buffer.tell():
+            result['text'] = text_buffer.getvalue()
             logger.info("Text data processed successfully")
         
         logger.info("PDF processing complete.")
         return result
     except Exception as e:
-        logger.error(f"Error processing PDF: {str(e)}")
+        logger.error("Error processing PDF: %s", e)
         raise
 
+def process_page_range(source, page_numbers):
+    """
+    Open the PDF restricted to the given 1-based page numbers and extract them with process_pdf.
+    Runs inside a worker process, so source is either a file path or the raw PDF bytes.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with pdfplumber.open(source, pages=page_numbers) as pdf:
+        return process_pdf(pdf)
+
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+def get_page_executor():
+    """
+    Return the process pool shared by all requests for PDF parsing, creating it on first use.
+    Sharing one pool avoids paying process start-up per request and bounds the CPU used by concurrent uploads.
+    The workers are long-lived, so pdfminer's process-wide CMap caches stay warm from one document to the next;
+    parsed fonts are cached per document by pdfplumber's resource manager and are not shared, since their
+    object ids are only meaningful within the PDF they came from.
+    """
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            # The pool is created from a worker thread of a threaded server; forking such a process can deadlock,
+            # so start workers from a clean forkserver (or spawn where forkserver is unavailable, e.g. Windows)
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _page_executor = ProcessPoolExecutor(
+                max_workers=PAGE_WORKERS,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+        return _page_executor
+
+def discard_page_executor(executor):
+    """
+    Drop a broken pool so the next get_page_executor() call starts a fresh one.
+    Only clears the shared reference if it still points at executor, so a pool rebuilt by another request is kept.
+    """
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is executor:
+            _page_executor = None
+    executor.shutdown(wait=False)
+
+def shutdown_page_executor():
+    """Shut down the shared PDF parsing pool, if it was started. Called on application shutdown."""
+    global _page_executor
+    with _page_executor_lock:
+        executor, _page_executor = _page_executor, None
+    if executor is not None:
+        executor.shutdown()
+
+def pdf_sha256(source) -> str:
+    """
+    Return the SHA-256 hex digest of a PDF given as a file path or raw bytes.
+    """
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extract_pdf(file_obj):
+    """
+    Extract tables/text from a PDF path or file-like object.
+    The result is cached by the SHA-256 of the PDF, so re-uploads of the same file skip parsing entirely.
+    pdfminer is pure Python and holds the GIL while parsing, so pages are always parsed in the shared
+    process pool to keep the API process responsive. Long documents are split into contiguous page ranges
+    that are parsed in parallel.
+    """
+    source = file_obj if isinstance(file_obj, str) else file_obj.read()
+    stream = source if isinstance(source, str) else io.BytesIO(source)
+
+    key = cache_key("pdf-text", EXTRACTION_VERSION, str(MAX_PAGES), pdf_sha256(source))
+    cached = load_cached_json(key, ttl=PDF_TEXT_CACHE_TTL_SECONDS)
+    if isinstance(cached, dict):
+        logger.info("Using cached extraction for PDF %.12s", key)
+        return cached
+
+    with pdfplumber.open(stream) as pdf:
+        pages_total = len(pdf.pages)
+    if pages_total == 0:
+        raise ValueError("PDF has no pages")
+    total_pages = min(pages_total, MAX_PAGES)
+    if total_pages < pages_total:
+        logger.warning("PDF has %d pages; only the first %d will be processed", pages_total, MAX_PAGES)
+    workers = max(1, min(PAGE_WORKERS, total_pages // MIN_PAGES_PER_WORKER))
+
+    range_size = -(-total_pages // workers)
+    page_ranges = [
+        list(range(start, min(start + range_size, total_pages + 1)))
+        for start in range(1, total_pages + 1, range_size)
+    ]
+    logger.info("Extracting %d pages in %d page range(s)", total_pages, len(page_ranges))
+
+    executor = get_page_executor()
+    try:
+        range_results = list(executor.map(process_page_range, [source] * len(page_ranges), page_ranges))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); the pool is unusable from now on, so replace it and retry once
+        logger.warning("PDF parsing pool is broken; restarting it and retrying")
+        discard_page_executor(executor)
+        executor = get_page_executor()
+        range_results = list(executor.map(process_page_range, [source] * len(page_ranges), page_ranges))
+
+    # Results come back in page order and are newline-terminated; combine each kind of data across ranges
+    result = {
+        'pages_total': pages_total,
+        'pages_processed': total_pages,
+        'truncated': total_pages < pages_total,
+    }
+    for kind in ('tables', 'text'):
+        parts = [r[kind] for r in range_results if kind in r]
+        if parts:
+            result[kind] = "".join(parts)
+
+    store_cached_json(key, result)
+    return result
+
 def split_into_chunks(text_data, max_chars=8000):
     """
     Split the statement text into manageable chunks based on character count.
-    Each chunk will contain at most max_chars characters.
+    Each chunk will contain at most max_chars characters and, where possible,
+    starts and ends on a line boundary so that transactions are not cut mid-row.
     """
+    # Split into chunks with some overlap to avoid missing context
+    overlap = 500  # Character overlap between chunks
+    if max_chars <= overlap:
+        raise ValueError(f"max_chars must be greater than the {overlap} character overlap, got {max_chars}")
+    
     # If text is short enough, return as a single chunk
     if len(text_data) <= max_chars:
         return [text_data]
     
-    # Split into chunks with some overlap to avoid missing context
-    overlap = 500  # Character overlap between chunks
     chunks = []
     
-    for i in range(0, len(text_data), max_chars - overlap):
-        chunk = text_data[i:min(i + max_chars, len(text_data))]
-        chunks.append(chunk)
+    start = 0
+    while start < len(text_data):
+        end = start + max_chars
+        if end >= len(text_data):
+            # The remainder fits in this chunk, so no tail chunk is needed
+            chunks.append(text_data[start:])
+            break
+        
+        # End on the last full line, unless that would leave no room past the overlap
+        newline = text_data.rfind("\n", start, end)
+        if newline > start + overlap:
+            end = newline + 1
+        chunks.append(text_data[start:end])
+        
+        # Start the next chunk at the first full line inside the overlap region
+        start = end - overlap
+        newline = text_data.find("\n", start, end - 1)
+        if newline != -1:
+            start = newline + 1
     
-    logger.info(f"Split data into {len(chunks)} chunks with {overlap} character overlap")
+    logger.info("Split data into %d chunks with %d character overlap", len(chunks), overlap)
     return chunks
 
-def extract_account_info(raw_statement: str) -> dict:
+def cache_key(*parts: str) -> str:
+    """
+    Build a content-addressable cache key from the given parts.
+    Each part is length-prefixed so that different splits of the same bytes never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+def normalize_for_cache(text: str) -> str:
+    """
+    Strip trailing whitespace from each line so that chunks differing only in trailing padding map to
+    the same cache key. Whitespace inside a line is kept as is: the width of a gap tells which cell
+    (e.g. debit or credit column) a value sits in.
+    """
+    return _TRAILING_WHITESPACE_RE.sub("", text)
+
+def load_cached_json(key: str, ttl: int = CACHE_TTL_SECONDS):
+    """
+    Return the JSON value stored under key, or None if it is missing, expired or unreadable.
+    """
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            os.remove(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Discarding unreadable cache entry %s: %s", key, e)
+        evict_cached_json(key)
+        return None
+
+def store_cached_json(key: str, value) -> None:
+    """
+    Store a JSON-serializable value under key. The write is atomic so readers never see partial files.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    tmp_path = None
+    try:
+        # A unique temp file per write, since the same key can be stored from several threads at once
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f"{key}.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write cache entry %s: %s", key, e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def evict_cached_json(key: str) -> None:
+    try:
+        os.remove(os.path.join(CACHE_DIR, f"{key}.json"))
+    except OSError:
+        pass
+
+def cached_completion(func):
+    """
+    Cache parsed OpenAI responses on disk, keyed by model, prompt version, response schema and prompt content.
+    A cached value that no longer validates against the response model is evicted and the API is called again.
+    """
+    @functools.wraps(func)
+    async def wrapper(system_prompt: str, user_prompt: str, response_model: type[BaseModel]):
+        key = cache_key(PROMPT_VERSION, OPENAI_MODEL, response_model.__name__, system_prompt, normalize_for_cache(user_prompt))
+        cached = load_cached_json(key)
+        if cached is not None:
+            try:
+                result = response_model.model_validate(cached)
+                logger.info("Using cached OpenAI response %.12s", key)
+                return result
+            except ValidationError:
+                evict_cached_json(key)
+
+        result = await func(system_prompt, user_prompt, response_model)
+        store_cached_json(key, result.model_dump())
+        return result
+    return wrapper
+
+@cached_completion
+async def request_structured_completion(system_prompt: str, user_prompt: str, response_model: type[BaseModel]):
+    """
+    Ask OpenAI for a response that conforms to response_model using structured outputs.
+    If the response still fails validation, the error is fed back to the model and the request retried.
+    """
+    base_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    messages = base_messages
+
+    for attempt in range(MAX_PARSE_RETRIES + 1):
+        try:
+            response = await client.beta.chat.completions.parse(
+                model=OPENAI_MODEL,
+                messages=messages,
+                response_format=response_model,
+                temperature=0.2
+            )
+        except ValidationError as e:
+            if attempt == MAX_PARSE_RETRIES:
+                raise
+            logger.warning("%s response failed validation (attempt %d): %s", response_model.__name__, attempt + 1, e)
+            # The failed answer is not available here, so give a plain instruction rather than refer to it
+            messages = base_messages + [{
+                "role": "user",
+                "content": (
+                    "Respond only with JSON that matches the required schema exactly. "
+                    f"Make sure the response avoids these validation errors:\n{e}"
+                )
+            }]
+            await asyncio.sleep(1.0 * (attempt + 1))
+            continue
+
+        message = response.choices[0].message
+        if message.parsed is None:
+            raise ValueError(f"OpenAI refused to extract {response_model.__name__}: {message.refusal}")
+        return message.parsed
+
+async def extract_account_info(raw_statement: str) -> dict:
     """
     Uses OpenAI API to extract just the account information from the bank statement.
     """
@@ -113,7 +442,7 @@ def extract_account_info(raw_statement: str) -> dict:
     )
 
     user_prompt = f"""
-Extract ONLY the following account information from this bank statement into JSON:
+Extract ONLY the following account information from this bank statement:
 
 {{
   "account_holder": "",  // IMPORTANT: Look for names in ALL CAPS or special formatting
@@ -122,8 +451,8 @@ Extract ONLY the following account information from this bank statement into JSO
     "start": "YYYY-MM-DD",  // Convert any date format to ISO
     "end": "YYYY-MM-DD"    // Convert any date format to ISO
   }},
-  "opening_balance": 0.0,  // Numeric value only
-  "closing_balance": 0.0,  // Numeric value only
+  "opening_balance": 0.0,  // Numeric value only, null if not stated
+  "closing_balance": 0.0,  // Numeric value only, null if not stated
   "currency": "",         // USD, EUR, GBP, PKR, etc.
   "statement_format": "wise/nayapay/bank_of_america/traditional/unknown"  // Identify the bank if possible
 }}
@@ -136,34 +465,12 @@ STATEMENT TEXT:
 """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.2
-        )
-
-        content = response.choices[0].message.content.strip()
+        account_info = await request_structured_completion(system_prompt, user_prompt, AccountInfo)
         logger.info("Successfully extracted account information")
-        
-        # Try to parse response as JSON
-        return json.loads(content)
+        return account_info.model_dump()
 
-    except json.JSONDecodeError:
-        logger.error("GPT response for account info is not valid JSON")
-        return {
-            "account_holder": "",
-            "account_number": "",
-            "statement_period": {"start": "", "end": ""},
-            "opening_balance": 0.0,
-            "closing_balance": 0.0,
-            "currency": "",
-            "statement_format": "unknown"
-        }
     except Exception as e:
-        logger.error(f"Error extracting account info: {e}")
+        logger.error("Error extracting account info: %s", e)
         return {
             "account_holder": "",
             "account_number": "",
@@ -174,7 +481,7 @@ STATEMENT TEXT:
             "statement_format": "unknown"
         }
 
-def extract_transactions_from_chunk(chunk: str) -> list:
+async def extract_transactions_from_chunk(chunk: str) -> list:
     """
     Uses OpenAI API to extract transactions from a chunk of the bank statement.
     """
@@ -186,19 +493,18 @@ def extract_transactions_from_chunk(chunk: str) -> list:
     )
 
     user_prompt = f"""
-Extract ONLY the transactions from this bank statement chunk into JSON array:
+Extract ONLY the transactions from this bank statement chunk into the "transactions" list.
+Each transaction looks like:
 
-[
   {{
     "date": "YYYY-MM-DD",  // Convert any date format to ISO
     "description": "cleaned description",
     "type": "debit/credit",  // debit for negative amounts, credit for positive
     "amount": 0.0,  // Absolute value
     "amount_with_sign": 0.0,  // Negative for debits, positive for credits
-    "running_balance": 0.0,  // Balance after this transaction
-    "reference": "if available"  // Any reference number or additional info
+    "running_balance": 0.0,  // Balance after this transaction, null if not shown
+    "reference": "if available"  // Any reference number or additional info, null if none
   }}
-]
 
 IMPORTANT INSTRUCTIONS:
 1. Include ALL transactions, especially currency conversions (e.g., 'Converted USD to PKR').
@@ -211,99 +517,78 @@ STATEMENT CHUNK:
 """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.2
-        )
-
-        content = response.choices[0].message.content.strip()
-        
-        # Try to parse response as JSON
-        transactions = json.loads(content)
-        return transactions if isinstance(transactions, list) else []
+        transaction_list = await request_structured_completion(system_prompt, user_prompt, TransactionList)
+        return [transaction.model_dump() for transaction in transaction_list.transactions]
 
-    except json.JSONDecodeError:
-        logger.error("GPT response for transactions is not valid JSON")
-        return []
     except Exception as e:
-        logger.error(f"Error extracting transactions: {e}")
+        logger.error("Error extracting transactions: %s", e)
         return []
 
-def parse_bank_statement_to_json(raw_statement: str) -> dict:
+async def parse_bank_statement_to_json(raw_statement: str) -> dict:
     """
     Uses OpenAI API to convert a raw bank statement string into structured JSON format.
-    Splits the statement into chunks to handle large statements efficiently.
+    Splits the statement into chunks and extracts them, together with the account information,
+    concurrently to handle large statements efficiently.
     """
-    # First, get account information from the beginning of the statement
-    account_info = extract_account_info(raw_statement)
-    
     # Split the statement into manageable chunks
     chunks = split_into_chunks(raw_statement, max_chars=8000)
     
-    # Process each chunk and collect transactions
-    all_transactions = []
-    for i, chunk in enumerate(chunks):
-        logger.info(f"Processing chunk {i+1}/{len(chunks)}")
-        chunk_transactions = extract_transactions_from_chunk(chunk)
-        all_transactions.extend(chunk_transactions)
-    
-    # Remove duplicate transactions
-    unique_transactions = []
-    seen_transactions = set()
+    # Process the chunks concurrently, bounded by a semaphore; gather keeps chunk order
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+
+    async def extract_with_limit(i, chunk):
+        async with semaphore:
+            logger.info("Processing chunk %d/%d", i + 1, len(chunks))
+            return await extract_transactions_from_chunk(chunk)
+
+    # The account information request is independent of the transactions, so it runs alongside them
+    account_info, *chunk_results = await asyncio.gather(
+        extract_account_info(raw_statement),
+        *[extract_with_limit(i, chunk) for i, chunk in enumerate(chunks)]
+    )
     
-    for transaction in all_transactions:
-        # Create a unique identifier for each transaction
-        # Using date, description, and amount as the key
-        transaction_key = (transaction.get('date', ''), 
-                          transaction.get('description', ''), 
-                          transaction.get('amount', 0))
-        
-        if transaction_key not in seen_transactions:
-            seen_transactions.add(transaction_key)
-            unique_transactions.append(transaction)
+    # Remove duplicate transactions (e.g. from overlapping chunks).
+    # Keyed on date, description and amount; dict insertion order keeps the first occurrence in place.
+    unique_by_key = {}
+    for chunk_transactions in chunk_results:
+        for transaction in chunk_transactions:
+            unique_by_key.setdefault(
+                (transaction.get('date', ''), transaction.get('description', ''), transaction.get('amount', 0)),
+                transaction
+            )
+    unique_transactions = list(unique_by_key.values())
     
     # Combine account info with all transactions
     result = account_info
     result['transactions'] = unique_transactions
     
-    logger.info(f"Total unique transactions extracted: {len(unique_transactions)}")
+    logger.info("Total unique transactions extracted: %d", len(unique_transactions))
     return result
 
 
 
-def process_pdf_to_json(file_obj):
-    # Open the PDF file using pdfplumber
+async def process_pdf_to_json(file_obj):
     try:
-        # If file_obj is a path string
-        if isinstance(file_obj, str):
-            pdf = pdfplumber.open(file_obj)
-        # If file_obj is a file-like object (from FastAPI)
-        else:
-            pdf = pdfplumber.open(file_obj)
-            
-        # Call process_pdf function with the opened PDF
-        extracted_text = process_pdf(pdf)
-        
-        # Close the PDF after processing
-        pdf.close()
+        # file_obj is either a path string or a file-like object.
+        # PDF parsing is blocking, so keep it off the event loop.
+        extracted = await asyncio.to_thread(extract_pdf, file_obj)
         
-        try:
-            extracted_text = extracted_text['tables']
-        except:
-            extracted_text = extracted_text['text']
-            
-        # Convert DataFrame to string if it's a DataFrame
-        extracted_text_string = extracted_text.to_string(index=False) if isinstance(extracted_text, pd.DataFrame) else extracted_text
+        if 'tables' in extracted:
+            extracted_text = extracted['tables']
+        elif 'text' in extracted:
+            extracted_text = extracted['text']
+        else:
+            raise ValueError("No text could be extracted from the PDF")
         
         # Process the extracted text using the chunking approach
-        structured_data = parse_bank_statement_to_json(extracted_text_string)
+        structured_data = await parse_bank_statement_to_json(extracted_text)
+        
+        # Tell the caller when pages beyond MAX_PAGES were skipped, so a partial result is not mistaken for a complete one
+        for field in ('pages_total', 'pages_processed', 'truncated'):
+            structured_data[field] = extracted[field]
         return structured_data
     except Exception as e:
-        logger.error(f"Error in process_pdf_to_json: {str(e)}")
+        logger.error("Error in process_pdf_to_json: %s", e)
         return {"error": f"Failed to process PDF: {str(e)}"}
 
 